@@ -1,8 +1,18 @@
+import glob
+import json
+import os
+import tempfile
+import threading
+import time
+
 import streamlit as st
 import pandas as pd
 import numpy as np
 import plotly.express as px
 import plotly.graph_objects as go
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
 
 ## INDICADORES
 ## Comparar emisiones de co2 con energías renovables
@@ -37,30 +47,56 @@ st.markdown(
 INDICADORES = {
     'Emisiones de CO₂ totales (kt)': {
         'archivo': 'data/EmCO2Tot.xlsx',
-        'nombre_valor': 'emisiones_co2_totales'
+        'nombre_valor': 'emisiones_co2_totales',
+        'agregacion': 'suma',
+        'limites': (0, None)
     },
     'PIB per cápita (USD constantes)': {
         'archivo': 'data/GDPercap.xlsx',
-        'nombre_valor': 'pib_per_capita'
+        'nombre_valor': 'pib_per_capita',
+        'agregacion': 'media',
+        'limites': (0, None)
     },
     'Participación de energías renovables (% consumo final)': {
         'archivo': 'data/RenEnergy.xlsx',
-        'nombre_valor': 'participacion_renovables'
+        'nombre_valor': 'participacion_renovables',
+        'agregacion': 'media',
+        'limites': (0, 100)
     },
     'Acceso a la electricidad (% de la población)': {
         'archivo': 'data/AccesElec.xlsx',
-        'nombre_valor': 'acceso_electricidad'
+        'nombre_valor': 'acceso_electricidad',
+        'agregacion': 'media',
+        'limites': (0, 100)
     },
     'Uso de combustibles limpios para cocinar (% de la población)': {
         'archivo': 'data/CleanFuelxCK.xlsx',
-        'nombre_valor': 'combustibles_limpios_cocinar'
+        'nombre_valor': 'combustibles_limpios_cocinar',
+        'agregacion': 'media',
+        'limites': (0, 100)
     },
     'Crecimiento poblacional (% anual)': {
         'archivo': 'data/PopGrow.xlsx',
-        'nombre_valor': 'crecimiento_poblacional'
+        'nombre_valor': 'crecimiento_poblacional',
+        'agregacion': 'media'
     }
 }
 
+# Agregados por región y grupo de ingreso (ver calcular_agregados):
+# - 'agregacion': 'suma' para magnitudes absolutas, 'media' para tasas y %.
+#   La suma se escala por la cobertura del grupo para no contar como cero a
+#   los países sin dato.
+# - 'peso' (opcional): nombre de otro indicador usado como ponderador de la
+#   media; sin él, la media es simple entre los países con dato. Ningún
+#   indicador lo define (el panel no trae población ni PIB absoluto), así que
+#   todas las medias actuales son simples.
+# ARCHIVO_PAISES_WDI: hoja 'Country' de WDICountry.xlsx (descarga masiva del
+# WDI), con las columnas 'Country Code', 'Region' e 'Income Group'.
+# 'limites' (opcional): rango válido (mínimo, máximo) de las proyecciones.
+ARCHIVO_PAISES_WDI = 'data/WDICountry.xlsx'
+HOJA_PAISES_WDI = 'Country'
+COBERTURA_MINIMA = 0.5
+
 ###############################################################################
 #                         FUNCIONES AUXILIARES                                #
 ###############################################################################
@@ -131,18 +167,993 @@ def cargar_indicador_wdi(ruta_archivo, nombre_valor):
     return df_largo
 
 
+###############################################################################
+#              PANEL ALMACENADO Y ACTUALIZACIÓN INCREMENTAL                   #
+###############################################################################
+
+# Cada indicador se guarda en data/panel/<nombre_valor>/ como una secuencia de
+# partes parquet de solo anexado (formato largo) más un manifiesto. Cada parte
+# contiene únicamente las celdas país–año nuevas o modificadas respecto a la
+# versión anterior; las celdas que desaparecen del WDI se anexan con valor
+# vacío. Al leer, la última versión de cada celda prevalece.
+DIRECTORIO_PANEL = 'data/panel'
+
+
+@st.cache_resource
+def obtener_candado_panel():
+    return threading.Lock()
+
+
+def firma_archivo(ruta_archivo):
+    '''Fecha de modificación y tamaño del archivo, usados para detectar cambios.'''
+    estado_archivo = os.stat(ruta_archivo)
+    return [estado_archivo.st_mtime_ns, estado_archivo.st_size]
+
+
+def leer_manifiesto(ruta_manifiesto):
+    if not os.path.exists(ruta_manifiesto):
+        return {
+            'firma_origen': None,
+            'version': 0,
+            'versiones_anio': {},
+            'versiones_pais': {}
+        }
+    with open(ruta_manifiesto, encoding='utf-8') as archivo:
+        return json.load(archivo)
+
+
+def escribir_manifiesto(ruta_manifiesto, manifiesto):
+    ruta_temporal = ruta_manifiesto + '.tmp'
+    with open(ruta_temporal, 'w', encoding='utf-8') as archivo:
+        json.dump(manifiesto, archivo)
+    os.replace(ruta_temporal, ruta_manifiesto)
+
+
+def listar_partes_panel(nombre_valor):
+    directorio = os.path.join(DIRECTORIO_PANEL, nombre_valor)
+    return sorted(glob.glob(os.path.join(directorio, 'parte_*.parquet')))
+
+
+def leer_panel_almacenado(nombre_valor):
+    '''
+    Reconstruye el panel largo de un indicador a partir de sus partes.
+
+    Mismas columnas que cargar_indicador_wdi.
+    '''
+    partes = listar_partes_panel(nombre_valor)
+    if not partes:
+        return pd.DataFrame({
+            'country_name': pd.Series(dtype=object),
+            'country_code': pd.Series(dtype=object),
+            'year': pd.Series(dtype=int),
+            nombre_valor: pd.Series(dtype=float)
+        })
+
+    df_panel = pd.concat([pd.read_parquet(parte) for parte in partes], ignore_index=True)
+    df_panel = df_panel.drop_duplicates(subset=['country_code', 'year'], keep='last')
+    df_panel = df_panel.dropna(subset=[nombre_valor])
+    return df_panel.sort_values(['year', 'country_name']).reset_index(drop=True)
+
+
+def iterar_panel_almacenado(nombre_valor, filtro=None, filas_por_bloque=50_000):
+    '''
+    Recorre el panel de un indicador en bloques de hasta 'filas_por_bloque'
+    filas, sin reconstruirlo en memoria.
+
+    'filtro' es una expresión de pyarrow.dataset y se aplica al leer. Cada
+    celda se emite solo desde la última parte que la contiene y las celdas
+    eliminadas (valor vacío) se omiten. La memoria queda acotada por un
+    bloque más las claves país–año de las partes posteriores a la primera
+    (los deltas de cada actualización). Los bloques siguen el orden de las
+    partes, no un orden por año o país.
+    '''
+    partes = listar_partes_panel(nombre_valor)
+
+    # Claves que alguna parte posterior reemplaza, para cada parte
+    claves_reemplazadas = [set() for _ in partes]
+    acumuladas = set()
+    for posicion in range(len(partes) - 1, 0, -1):
+        tabla_claves = pq.read_table(partes[posicion], columns=['country_code', 'year'])
+        acumuladas = acumuladas | set(zip(
+            tabla_claves.column('country_code').to_pylist(),
+            tabla_claves.column('year').to_pylist()
+        ))
+        claves_reemplazadas[posicion - 1] = acumuladas
+
+    for parte, reemplazadas in zip(partes, claves_reemplazadas):
+        for lote in ds.dataset(parte).to_batches(filter=filtro, batch_size=filas_por_bloque):
+            bloque = lote.to_pandas()
+            if reemplazadas:
+                claves = pd.MultiIndex.from_arrays([bloque['country_code'], bloque['year']])
+                bloque = bloque[~claves.isin(reemplazadas)]
+            bloque = bloque.dropna(subset=[nombre_valor])
+            if not bloque.empty:
+                yield bloque
+
+
+def calcular_delta_panel(df_almacenado, df_nuevo, nombre_valor):
+    '''
+    Compara el panel almacenado con una nueva versión del archivo WDI y
+    devuelve solo las celdas país–año nuevas, modificadas o eliminadas (estas
+    últimas con valor vacío). Las columnas 'Yxxxx' nuevas aparecen aquí como
+    celdas nuevas de ese año.
+    '''
+    comparacion = pd.merge(
+        df_nuevo,
+        df_almacenado,
+        on=['country_code', 'year'],
+        how='outer',
+        suffixes=('', '_anterior'),
+        indicator=True
+    )
+    cambiado = (
+        (comparacion['_merge'] != 'both')
+        | (comparacion[nombre_valor] != comparacion[f'{nombre_valor}_anterior'])
+        | (comparacion['country_name'] != comparacion['country_name_anterior'])
+    )
+    delta = comparacion.loc[cambiado].copy()
+    delta['country_name'] = delta['country_name'].fillna(delta['country_name_anterior'])
+    delta[nombre_valor] = delta[nombre_valor].astype(float)
+    return delta[['country_name', 'country_code', 'year', nombre_valor]].reset_index(drop=True)
+
+
+def actualizar_panel(ruta_archivo, nombre_valor):
+    '''
+    Sincroniza el panel almacenado de un indicador con su archivo WDI.
+
+    Si el archivo no cambió desde la última sincronización (misma fecha de
+    modificación y tamaño) no se lee. Si cambió, se anexa una parte nueva con
+    el delta y se incrementa la versión de los años y países afectados, de
+    modo que solo se invalidan las cachés que dependen de ellos.
+
+    Devuelve el manifiesto:
+    - 'version': contador global de actualizaciones
+    - 'versiones_anio': última versión que modificó cada año
+    - 'versiones_pais': última versión que modificó cada país
+    '''
+    directorio = os.path.join(DIRECTORIO_PANEL, nombre_valor)
+    ruta_manifiesto = os.path.join(directorio, 'manifiesto.json')
+    firma = firma_archivo(ruta_archivo)
+
+    with obtener_candado_panel():
+        manifiesto = leer_manifiesto(ruta_manifiesto)
+        if manifiesto['firma_origen'] == firma:
+            return manifiesto
+
+        df_nuevo = cargar_indicador_wdi(ruta_archivo, nombre_valor)
+        df_almacenado = leer_panel_almacenado(nombre_valor)
+        delta = calcular_delta_panel(df_almacenado, df_nuevo, nombre_valor)
+
+        os.makedirs(directorio, exist_ok=True)
+        if not delta.empty:
+            version = manifiesto['version'] + 1
+            ruta_parte = os.path.join(directorio, f'parte_{version:05d}.parquet')
+            delta.to_parquet(ruta_parte + '.tmp', index=False)
+            os.replace(ruta_parte + '.tmp', ruta_parte)
+
+            manifiesto['version'] = version
+            for anio in delta['year'].unique():
+                manifiesto['versiones_anio'][str(int(anio))] = version
+            for codigo in delta['country_code'].unique():
+                manifiesto['versiones_pais'][str(codigo)] = version
+
+        manifiesto['firma_origen'] = firma
+        escribir_manifiesto(ruta_manifiesto, manifiesto)
+
+    return manifiesto
+
+
+@st.cache_resource
+def obtener_manifiestos_vigentes():
+    '''Último manifiesto conocido de cada indicador: nombre_valor → (firma, manifiesto).'''
+    return {}
+
+
+def obtener_manifiesto(nombre_indicador):
+    '''
+    Manifiesto del panel de un indicador.
+
+    Mientras el archivo WDI conserve su firma se devuelve el manifiesto ya
+    conocido (un os.stat, sin candado ni lectura del JSON); solo cuando la
+    firma cambia se pasa por actualizar_panel.
+    '''
+    info_indicador = INDICADORES[nombre_indicador]
+    vigentes = obtener_manifiestos_vigentes()
+    firma = firma_archivo(info_indicador['archivo'])
+
+    conocido = vigentes.get(info_indicador['nombre_valor'])
+    if conocido is not None and conocido[0] == firma:
+        return conocido[1]
+
+    manifiesto = actualizar_panel(info_indicador['archivo'], info_indicador['nombre_valor'])
+    vigentes[info_indicador['nombre_valor']] = (firma, manifiesto)
+    return manifiesto
+
+
+def version_anio(nombre_indicador, anio):
+    return obtener_manifiesto(nombre_indicador)['versiones_anio'].get(str(int(anio)), 0)
+
+
+def version_pais(nombre_indicador, codigo_pais):
+    manifiesto = obtener_manifiesto(nombre_indicador)
+    if es_codigo_agregado(codigo_pais):
+        # Un agregado depende de todos sus países miembros y de su pertenencia
+        return (manifiesto['version'], firma_paises_wdi())
+    return manifiesto['versiones_pais'].get(str(codigo_pais), 0)
+
+
+def versiones_indicadores():
+    return tuple(obtener_manifiesto(nombre)['version'] for nombre in INDICADORES)
+
+
+# Las cachés con clave de versión llevan max_entries: al publicarse una versión
+# nueva, sus resultados desplazan a los de la anterior en lugar de acumularse.
+# El tamaño cubre todas las combinaciones vigentes con holgura para dos versiones.
+@st.cache_data(max_entries=2 * len(INDICADORES), show_spinner=False)
+def leer_panel_en_cache(nombre_valor, version):
+    return leer_panel_almacenado(nombre_valor)
+
+
 def obtener_df_indicador(nombre_indicador):
     '''
-    Carga un indicador concreto, según el diccionario INDICADORES.
+    Carga un indicador concreto, según el diccionario INDICADORES, desde el
+    panel almacenado (sincronizándolo antes con su archivo WDI).
+    '''
+    manifiesto = obtener_manifiesto(nombre_indicador)
+    return leer_panel_en_cache(INDICADORES[nombre_indicador]['nombre_valor'], manifiesto['version'])
+
+
+###############################################################################
+#              AGREGADOS POR REGIÓN Y GRUPO DE INGRESO                        #
+###############################################################################
+
+PREFIJO_AGREGADO = 'AGR:'
+
+
+def es_codigo_agregado(codigo_pais):
+    return str(codigo_pais).startswith(PREFIJO_AGREGADO)
+
+
+def firma_paises_wdi():
+    if not os.path.exists(ARCHIVO_PAISES_WDI):
+        return None
+    return tuple(firma_archivo(ARCHIVO_PAISES_WDI))
+
+
+@st.cache_data(max_entries=2, show_spinner=False)
+def cargar_grupos_paises(firma):
+    '''
+    Lee la hoja 'Country' del WDI y devuelve la pertenencia de cada país a su
+    región y a su grupo de ingreso.
+
+    Columnas de salida:
+    - 'country_code'
+    - 'codigo_grupo' (p. ej. 'AGR:Región: Latin America & Caribbean')
+    - 'nombre_grupo' (p. ej. 'Región: Latin America & Caribbean')
+
+    Los agregados del propio WDI no tienen región y quedan fuera. 'firma'
+    (ver firma_paises_wdi) solo actúa como clave de caché.
+    '''
+    df_paises = pd.read_excel(ARCHIVO_PAISES_WDI, sheet_name=HOJA_PAISES_WDI)
+
+    columnas_requeridas = ['Country Code', 'Region', 'Income Group']
+    if any(columna not in df_paises.columns for columna in columnas_requeridas):
+        raise KeyError(
+            f'La hoja {HOJA_PAISES_WDI} de {ARCHIVO_PAISES_WDI} debe contener las columnas '
+            f'"Country Code", "Region" e "Income Group".'
+        )
+
+    df_paises = df_paises.dropna(subset=['Region'])
+
+    partes = []
+    for columna, prefijo in [('Region', 'Región'), ('Income Group', 'Ingreso')]:
+        df_grupo = df_paises[['Country Code', columna]].dropna()
+        partes.append(pd.DataFrame({
+            'country_code': df_grupo['Country Code'].astype(str).to_numpy(),
+            'nombre_grupo': (prefijo + ': ' + df_grupo[columna].astype(str)).to_numpy()
+        }))
+
+    grupos = pd.concat(partes, ignore_index=True)
+    grupos['codigo_grupo'] = PREFIJO_AGREGADO + grupos['nombre_grupo']
+    return grupos
+
+
+@st.cache_data(max_entries=2 * len(INDICADORES), show_spinner=False)
+def calcular_agregados(nombre_indicador, version, version_peso, firma_grupos):
+    '''
+    Calcula los agregados por región y grupo de ingreso de un indicador para
+    todos los años a la vez.
+
+    El panel se pasa a una matriz países × años y la pertenencia a grupos a
+    una matriz indicadora grupos × países, de modo que cada reducción es un
+    producto de matrices:
+    - 'suma': suma de los países con dato dividida por la cobertura, es
+      decir, los países sin dato se imputan con la media de los que tienen
+    - 'media': media (ponderada por el indicador 'peso', si lo hay) de los
+      países con dato
+
+    Cada celda lleva su 'cobertura': fracción de países del grupo con dato.
+    Las celdas con cobertura menor a COBERTURA_MINIMA quedan vacías.
+
+    Devuelve un DataFrame con las columnas de cargar_indicador_wdi más
+    'cobertura'; 'country_name' y 'country_code' identifican al grupo.
+    Los parámetros de versión y firma solo actúan como clave de caché.
     '''
     info_indicador = INDICADORES[nombre_indicador]
-    return cargar_indicador_wdi(info_indicador['archivo'], info_indicador['nombre_valor'])
+    nombre_valor = info_indicador['nombre_valor']
+    grupos = cargar_grupos_paises(firma_grupos)
+
+    df_indicador = obtener_df_indicador(nombre_indicador)
+    codigos = np.sort(grupos['country_code'].unique())
+    tabla = df_indicador.pivot_table(index='country_code', columns='year', values=nombre_valor)
+    tabla = tabla.reindex(index=codigos)
+    valores = tabla.to_numpy().astype(float)
+
+    if info_indicador.get('peso'):
+        df_peso = obtener_df_indicador(info_indicador['peso'])
+        pesos = df_peso.pivot_table(
+            index='country_code', columns='year', values=obtener_nombre_columna_valor(info_indicador['peso'])
+        ).reindex(index=codigos, columns=tabla.columns).to_numpy().astype(float)
+    else:
+        pesos = np.ones_like(valores)
+
+    valido = ~np.isnan(valores) & ~np.isnan(pesos)
+    valores_0 = np.where(valido, valores, 0.0)
+    pesos_0 = np.where(valido, pesos, 0.0)
+
+    codigos_grupo, posicion_grupo = np.unique(grupos['codigo_grupo'].to_numpy(), return_inverse=True)
+    pertenencia = np.zeros((len(codigos_grupo), len(codigos)))
+    pertenencia[posicion_grupo, np.searchsorted(codigos, grupos['country_code'].to_numpy())] = 1.0
+
+    cobertura = (pertenencia @ valido) / pertenencia.sum(axis=1, keepdims=True)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        if info_indicador.get('agregacion') == 'suma':
+            agregado = (pertenencia @ valores_0) / cobertura
+        else:
+            agregado = (pertenencia @ (valores_0 * pesos_0)) / (pertenencia @ pesos_0)
+    agregado[cobertura < COBERTURA_MINIMA] = np.nan
+
+    nombres_grupo = dict(zip(grupos['codigo_grupo'], grupos['nombre_grupo']))
+    anios = tabla.columns.to_numpy()
+    df_agregados = pd.DataFrame({
+        'country_name': np.repeat([nombres_grupo[codigo] for codigo in codigos_grupo], len(anios)),
+        'country_code': np.repeat(codigos_grupo, len(anios)),
+        'year': np.tile(anios, len(codigos_grupo)),
+        nombre_valor: agregado.ravel(),
+        'cobertura': cobertura.ravel()
+    })
+    return df_agregados.dropna(subset=[nombre_valor]).reset_index(drop=True)
+
+
+def obtener_df_con_agregados(nombre_indicador):
+    '''
+    Como obtener_df_indicador, pero añade al final los agregados por región
+    y grupo de ingreso (si el archivo de países del WDI está disponible).
+    '''
+    df_indicador = obtener_df_indicador(nombre_indicador)
+    firma_grupos = firma_paises_wdi()
+    if firma_grupos is None:
+        return df_indicador
+
+    peso = INDICADORES[nombre_indicador].get('peso')
+    df_agregados = calcular_agregados(
+        nombre_indicador,
+        obtener_manifiesto(nombre_indicador)['version'],
+        obtener_manifiesto(peso)['version'] if peso else 0,
+        firma_grupos
+    )
+    return pd.concat([df_indicador, df_agregados], ignore_index=True)
+
+
+def ordenar_entidades(df):
+    '''Nombres de países y agregados de df, con los agregados primero.'''
+    entidades = df[['country_name', 'country_code']].drop_duplicates('country_name')
+    agregado = entidades['country_code'].map(es_codigo_agregado)
+    return sorted(entidades.loc[agregado, 'country_name']) + sorted(entidades.loc[~agregado, 'country_name'])
 
 
 def obtener_nombre_columna_valor(nombre_indicador):
     return INDICADORES[nombre_indicador]['nombre_valor']
 
 
+def preparar_seleccion_paises(clave, opciones, maximo):
+    '''
+    Inicializa (o depura) en session_state la selección de un multiselect de
+    países, de modo que otras secciones puedan prellenarla.
+
+    Se conservan solo los países presentes en las opciones actuales y como
+    máximo 'maximo' elementos. Si no hay selección previa se usan los
+    primeros países de la lista.
+    '''
+    seleccion = st.session_state.get(clave, opciones[:maximo])
+    st.session_state[clave] = [pais for pais in seleccion if pais in opciones][:maximo]
+
+
+###############################################################################
+#                    CÁLCULOS DERIVADOS EN CACHÉ                              #
+###############################################################################
+
+# Los parámetros 'version*' solo actúan como clave de caché: provienen del
+# manifiesto del panel (por año o por país), de modo que una actualización
+# del WDI invalida únicamente las entradas de los años o países que cambió.
+
+BINS_SIGMA = [-999, -2.0, -1.5, -1.0, -0.5, 0.0, 0.5, 1.0, 1.5, 2.0, 999]
+ETIQUETAS_BINS_SIGMA = [
+    '< -2σ', '-2σ a -1.5σ', '-1.5σ a -1σ', '-1σ a -0.5σ', '-0.5σ a 0σ',
+    '0σ a 0.5σ', '0.5σ a 1σ', '1σ a 1.5σ', '1.5σ a 2σ', '> 2σ'
+]
+
+ANIO_REFERENCIA_AJUSTE = 2000
+
+
+@st.cache_data(max_entries=500, show_spinner=False)
+def calcular_bins_sigma(nombre_indicador, anio, version):
+    '''
+    Clasifica los países de un año en bins de 0.5σ respecto a la media del
+    año.
+
+    Devuelve (df_anio, hay_variacion): df_anio trae la columna 'color_bin';
+    si la desviación estándar es nula, 'color_bin' vale 'sin variación'.
+    '''
+    df_indicador = obtener_df_indicador(nombre_indicador)
+    df_anio = df_indicador[df_indicador['year'] == anio].copy()
+    serie = df_anio[obtener_nombre_columna_valor(nombre_indicador)].astype(float)
+
+    mu = float(serie.mean()) if len(serie) else 0.0
+    sd = float(serie.std(ddof=1)) if len(serie) > 1 else 0.0
+    if sd > 0:
+        z = (serie - mu) / sd
+        df_anio['color_bin'] = pd.cut(z, bins=BINS_SIGMA, labels=ETIQUETAS_BINS_SIGMA)
+        return df_anio, True
+
+    df_anio['color_bin'] = 'sin variación'
+    return df_anio, False
+
+
+@st.cache_data(max_entries=2000, show_spinner=False)
+def calcular_correlacion_anio(indicador_a, indicador_b, anio, version_a, version_b):
+    '''
+    Correlación de Pearson entre dos indicadores para los países con ambos
+    datos en un año (NaN si no puede calcularse).
+    '''
+    df_a = obtener_df_indicador(indicador_a)
+    df_b = obtener_df_indicador(indicador_b)
+    col_a = obtener_nombre_columna_valor(indicador_a)
+    col_b = obtener_nombre_columna_valor(indicador_b)
+
+    df_anio = pd.merge(
+        df_a.loc[df_a['year'] == anio, ['country_code', col_a]],
+        df_b.loc[df_b['year'] == anio, ['country_code', col_b]],
+        on='country_code',
+        how='inner'
+    ).dropna()
+    if len(df_anio) < 2:
+        return float('nan')
+    return float(df_anio[col_a].corr(df_anio[col_b]))
+
+
+@st.cache_data(max_entries=500, show_spinner=False)
+def calcular_indice_rangos(nombre_indicador, anio, version):
+    '''
+    Índice de posiciones de un indicador en un año.
+
+    Devuelve (indice, hay_terciles). 'indice' es un DataFrame indexado por
+    'country_code', ya en orden descendente de valor, con las columnas:
+    - 'country_name', 'valor'
+    - 'rango': 1 = valor más alto (empates comparten rango)
+    - 'percentil': 0–100, más alto = mayor valor
+    - 'tercil': 'Bajo' / 'Medio' / 'Alto' (pd.qcut en terciles), o
+      'sin variación' si no se pueden formar terciles (hay_terciles=False)
+
+    El orden de las tablas, el top-k (head) y el bottom-k (tail) se leen
+    directamente de aquí, sin ordenar en cada rerun.
+    '''
+    df_indicador = obtener_df_indicador(nombre_indicador)
+    df_anio = df_indicador[df_indicador['year'] == anio]
+    valores = df_anio[obtener_nombre_columna_valor(nombre_indicador)].to_numpy().astype(float)
+    orden = np.argsort(-valores, kind='stable')
+
+    indice = pd.DataFrame(
+        {
+            'country_name': df_anio['country_name'].to_numpy()[orden],
+            'valor': valores[orden]
+        },
+        index=pd.Index(df_anio['country_code'].to_numpy()[orden], name='country_code')
+    )
+    indice['rango'] = indice['valor'].rank(method='min', ascending=False).astype(int)
+    indice['percentil'] = 100 * indice['valor'].rank(pct=True)
+
+    try:
+        indice['tercil'] = pd.qcut(indice['valor'], q=3, labels=['Bajo', 'Medio', 'Alto'])
+        return indice, True
+    except Exception:
+        # Pocos valores únicos: no se pueden formar terciles
+        indice['tercil'] = 'sin variación'
+        return indice, False
+
+
+def ordenar_segun_indice(df, indice):
+    '''
+    Devuelve las filas de df (con columna 'country_code') en el orden del
+    índice de rangos, conservando el índice original de df.
+    '''
+    posiciones = pd.Series(np.arange(len(df)), index=df['country_code'].to_numpy())
+    orden = indice.index[indice.index.isin(posiciones.index)]
+    return df.iloc[posiciones.loc[orden].to_numpy()]
+
+
+def acumular(valores):
+    '''Sumas prefijo a lo largo del primer eje, con una fila inicial de ceros.'''
+    valores = np.asarray(valores, dtype=float)
+    return np.concatenate([np.zeros((1,) + valores.shape[1:]), np.cumsum(valores, axis=0)])
+
+
+@st.cache_data(max_entries=2000, show_spinner=False)
+def calcular_sumas_prefijo(indicador_co2, indicador_ren, codigo_pais, usar_log_co2, version_co2, version_ren):
+    '''
+    Precalcula, para un país, las sumas acumuladas por año de los productos
+    cruzados que necesitan los ajustes de la proyección a 2030:
+    - renovables ~ año            (prefijo 'ren', diseño [año, 1])
+    - CO₂ ~ 1 + año + renovables  (prefijo 'co2', CO₂ opcionalmente en log)
+
+    Con ellas el ajuste sobre cualquier rango de años se obtiene restando dos
+    filas (ver ajustar_rango), sin recorrer de nuevo la serie. Los años se
+    centran en ANIO_REFERENCIA_AJUSTE para mejorar el condicionamiento.
+    '''
+    df_co2 = obtener_df_con_agregados(indicador_co2)
+    df_ren = obtener_df_con_agregados(indicador_ren)
+    col_co2 = obtener_nombre_columna_valor(indicador_co2)
+    col_ren = obtener_nombre_columna_valor(indicador_ren)
+
+    df_p = pd.merge(
+        df_co2.loc[df_co2['country_code'] == codigo_pais, ['year', col_co2]],
+        df_ren.loc[df_ren['country_code'] == codigo_pais, ['year', col_ren]],
+        on='year', how='inner'
+    ).dropna().sort_values('year')
+
+    t = df_p['year'].to_numpy().astype(float) - ANIO_REFERENCIA_AJUSTE
+    ren = df_p[col_ren].to_numpy().astype(float)
+    co2 = df_p[col_co2].to_numpy().astype(float)
+    unos = np.ones_like(t)
+
+    # En escala log solo entran los años con CO₂ > 0
+    if usar_log_co2:
+        valido = co2 > 0
+        y_co2 = np.log(np.where(valido, co2, 1.0))
+    else:
+        valido = np.ones(len(co2), dtype=bool)
+        y_co2 = co2
+
+    X_ren = np.column_stack([t, unos])
+    X_co2 = np.column_stack([unos, t, ren]) * valido[:, None]
+    y_co2 = y_co2 * valido
+
+    return {
+        'anios': df_p['year'].to_numpy(),
+        'ren_XtX': acumular(np.einsum('ni,nj->nij', X_ren, X_ren)),
+        'ren_Xty': acumular(X_ren * ren[:, None]),
+        'ren_yy': acumular(ren ** 2),
+        'ren_y': acumular(ren),
+        'ren_n': acumular(unos),
+        'co2_XtX': acumular(np.einsum('ni,nj->nij', X_co2, X_co2)),
+        'co2_Xty': acumular(X_co2 * y_co2[:, None]),
+        'co2_yy': acumular(y_co2 ** 2),
+        'co2_y': acumular(y_co2),
+        'co2_n': acumular(valido)
+    }
+
+
+def ajustar_rango(sumas, prefijo, anio_inicio, anio_fin):
+    '''
+    Ajuste por mínimos cuadrados sobre los años [anio_inicio, anio_fin] a
+    partir de las sumas prefijo de calcular_sumas_prefijo.
+
+    Devuelve (beta, r2, n). Equivale a np.linalg.lstsq sobre los datos del
+    rango (la pseudoinversa de X'X coincide con la de X).
+    '''
+    i0 = int(np.searchsorted(sumas['anios'], anio_inicio, side='left'))
+    i1 = int(np.searchsorted(sumas['anios'], anio_fin, side='right'))
+
+    def tramo(clave):
+        return sumas[f'{prefijo}_{clave}'][i1] - sumas[f'{prefijo}_{clave}'][i0]
+
+    XtX, Xty, yy, y, n = tramo('XtX'), tramo('Xty'), tramo('yy'), tramo('y'), tramo('n')
+    if n < 1:
+        return None, float('nan'), 0
+
+    beta, _, _, _ = np.linalg.lstsq(XtX, Xty, rcond=None)
+    ss_res = max(float(yy - 2 * beta @ Xty + beta @ XtX @ beta), 0.0)
+    ss_tot = float(yy - y ** 2 / n) if n > 1 else 0.0
+    r2 = 1 - ss_res / ss_tot if ss_tot > 1e-12 * max(float(yy), 1.0) else float('nan')
+    return beta, r2, int(n)
+
+
+###############################################################################
+#                 ÍNDICE DE SIMILITUD ENTRE PAÍSES                            #
+###############################################################################
+
+ANIO_INICIO_TRAYECTORIA = 2000
+
+
+@st.cache_data(max_entries=2, show_spinner=False)
+def construir_indice_similitud(versiones):
+    '''
+    Construye el índice de vecinos más cercanos sobre las trayectorias de los
+    países.
+
+    Cada país se representa como un vector de longitud fija que concatena,
+    para cada indicador, su serie normalizada (z-score del indicador) desde
+    ANIO_INICIO_TRAYECTORIA hasta el último año disponible. Los vacíos se
+    completan por interpolación dentro de la serie del país y, si el país no
+    tiene datos del indicador, con la media (0 tras normalizar). Cada bloque
+    se divide por la raíz de su número de años para que todos los
+    indicadores pesen lo mismo.
+
+    Devuelve un diccionario con:
+    - 'codigos': códigos de país (orden de las filas)
+    - 'nombres': nombres de país
+    - 'vectores': matriz (países × dimensiones)
+    - 'normas2': norma al cuadrado de cada vector (precalculada)
+    - 'cobertura': fracción de celdas con dato observado por país
+
+    'versiones' (ver versiones_indicadores) solo actúa como clave de caché.
+    '''
+    bloques = []
+    nombres = {}
+    for nombre_indicador in INDICADORES:
+        df = obtener_df_indicador(nombre_indicador)
+        columna_valor = obtener_nombre_columna_valor(nombre_indicador)
+        df = df[df['year'] >= ANIO_INICIO_TRAYECTORIA]
+        nombres.update(zip(df['country_code'], df['country_name']))
+
+        tabla = df.pivot_table(index='country_code', columns='year', values=columna_valor)
+        tabla = tabla.reindex(columns=range(ANIO_INICIO_TRAYECTORIA, int(tabla.columns.max()) + 1))
+        bloques.append(tabla.astype(float))
+
+    codigos = sorted(nombres)
+    partes_vector = []
+    partes_observadas = []
+    for tabla in bloques:
+        tabla = tabla.reindex(index=codigos)
+        observado = tabla.notna().to_numpy()
+
+        valores = tabla.to_numpy()
+        mu = np.nanmean(valores)
+        sd = np.nanstd(valores)
+        tabla = (tabla - mu) / sd if sd > 0 else tabla - mu
+
+        tabla = tabla.interpolate(axis=1, limit_direction='both').fillna(0.0)
+        partes_vector.append(tabla.to_numpy() / np.sqrt(tabla.shape[1]))
+        partes_observadas.append(observado)
+
+    vectores = np.hstack(partes_vector)
+    observadas = np.hstack(partes_observadas)
+
+    return {
+        'codigos': np.array(codigos),
+        'nombres': np.array([nombres[codigo] for codigo in codigos]),
+        'vectores': vectores,
+        'normas2': np.einsum('ij,ij->i', vectores, vectores),
+        'cobertura': observadas.mean(axis=1)
+    }
+
+
+def vecinos_mas_cercanos(indice, filas, k=5, tam_bloque=256):
+    '''
+    Devuelve, para cada fila consultada del índice, las filas de sus k
+    vecinos más cercanos (distancia euclidiana) y sus distancias, excluyendo
+    la propia fila.
+
+    Usa ||a - b||² = ||a||² + ||b||² - 2·a·b con las normas precalculadas y
+    resuelve las consultas por bloques de 'tam_bloque' filas, de modo que la
+    matriz de distancias intermedia nunca supera tam_bloque × países.
+    '''
+    vectores = indice['vectores']
+    normas2 = indice['normas2']
+    filas = np.atleast_1d(np.asarray(filas, dtype=int))
+    k = max(0, min(k, len(normas2) - 1))
+
+    vecinos = np.empty((len(filas), k), dtype=int)
+    distancias = np.empty((len(filas), k))
+    if k == 0:
+        return vecinos, distancias
+
+    for inicio in range(0, len(filas), tam_bloque):
+        bloque = filas[inicio:inicio + tam_bloque]
+        d2 = normas2[bloque][:, None] + normas2[None, :] - 2.0 * (vectores[bloque] @ vectores.T)
+        np.maximum(d2, 0.0, out=d2)
+        d2[np.arange(len(bloque)), bloque] = np.inf
+
+        candidatos = np.argpartition(d2, k - 1, axis=1)[:, :k]
+        d_candidatos = np.take_along_axis(d2, candidatos, axis=1)
+        orden = np.argsort(d_candidatos, axis=1)
+
+        fin = inicio + len(bloque)
+        vecinos[inicio:fin] = np.take_along_axis(candidatos, orden, axis=1)
+        distancias[inicio:fin] = np.sqrt(np.take_along_axis(d_candidatos, orden, axis=1))
+
+    return vecinos, distancias
+
+
+###############################################################################
+#                  EXPORTACIÓN DEL PANEL POR BLOQUES                          #
+###############################################################################
+
+FILAS_POR_BLOQUE = 50_000
+ANTIGUEDAD_MAXIMA_EXPORTACION = 3600
+
+ESQUEMA_EXPORTACION = pa.schema([
+    ('country_name', pa.string()),
+    ('country_code', pa.string()),
+    ('year', pa.int64()),
+    ('indicador', pa.string()),
+    ('valor', pa.float64())
+])
+
+
+def exportar_panel(tarea, indicadores, codigos_paises, rango_anios, formato, ruta):
+    '''
+    Escribe en 'ruta' (CSV o Parquet) la selección del panel almacenado en
+    formato largo: país, año, indicador y valor.
+
+    Los datos se leen y escriben en bloques de FILAS_POR_BLOQUE filas (ver
+    iterar_panel_almacenado), de modo que la memoria no crece con el tamaño
+    del indicador ni de la exportación.
+
+    Pensada para correr en un hilo aparte: no usa la API de Streamlit y
+    reporta su avance en el diccionario 'tarea' ('estado', 'progreso',
+    'filas', 'error').
+    '''
+    filtro = (ds.field('year') >= int(rango_anios[0])) & (ds.field('year') <= int(rango_anios[1]))
+    if codigos_paises:
+        filtro = filtro & ds.field('country_code').isin(list(codigos_paises))
+
+    escritor_parquet = None
+    archivo_csv = None
+    try:
+        if formato == 'CSV':
+            archivo_csv = open(ruta, 'w', encoding='utf-8', newline='')
+        else:
+            escritor_parquet = pq.ParquetWriter(ruta, ESQUEMA_EXPORTACION)
+
+        for posicion, nombre_indicador in enumerate(indicadores):
+            nombre_valor = obtener_nombre_columna_valor(nombre_indicador)
+            partes = listar_partes_panel(nombre_valor)
+            filas_leidas = 0
+            filas_totales = ds.dataset(partes).count_rows(filter=filtro) if partes else 0
+
+            for bloque in iterar_panel_almacenado(nombre_valor, filtro, FILAS_POR_BLOQUE):
+                filas_leidas += len(bloque)
+                bloque = bloque[['country_name', 'country_code', 'year', nombre_valor]]
+                bloque = bloque.rename(columns={nombre_valor: 'valor'})
+                bloque.insert(3, 'indicador', nombre_indicador)
+
+                if escritor_parquet is not None:
+                    escritor_parquet.write_table(
+                        pa.Table.from_pandas(bloque, schema=ESQUEMA_EXPORTACION, preserve_index=False)
+                    )
+                else:
+                    bloque.to_csv(archivo_csv, header=tarea['filas'] == 0, index=False)
+
+                tarea['filas'] += len(bloque)
+                avance = min(filas_leidas / filas_totales, 1.0) if filas_totales else 1.0
+                tarea['progreso'] = (posicion + avance) / len(indicadores)
+
+            tarea['progreso'] = (posicion + 1) / len(indicadores)
+
+        tarea['estado'] = 'terminado'
+    except Exception as error:
+        tarea['error'] = str(error)
+        tarea['estado'] = 'error'
+    finally:
+        if escritor_parquet is not None:
+            escritor_parquet.close()
+        if archivo_csv is not None:
+            archivo_csv.close()
+
+
+@st.cache_data(max_entries=64, show_spinner=False)
+def resumir_indicadores(indicadores, versiones):
+    '''
+    Países (nombre → código) y rango de años cubiertos por los indicadores.
+    'versiones' solo actúa como clave de caché.
+    '''
+    paises = {}
+    anios = []
+    for nombre_indicador in indicadores:
+        df_indicador = obtener_df_indicador(nombre_indicador)
+        paises.update(zip(df_indicador['country_name'], df_indicador['country_code']))
+        anios.extend([int(df_indicador['year'].min()), int(df_indicador['year'].max())])
+    return paises, (min(anios), max(anios))
+
+
+@st.cache_resource
+def obtener_directorio_exportaciones():
+    '''
+    Directorio temporal propio del proceso para los archivos exportados; se
+    borra con todo su contenido al terminar el proceso.
+    '''
+    return tempfile.TemporaryDirectory(prefix='ods7_exportaciones_')
+
+
+def limpiar_exportaciones_antiguas():
+    '''
+    Borra los archivos exportados con más de ANTIGUEDAD_MAXIMA_EXPORTACION
+    segundos, incluidos los de sesiones que ya se cerraron.
+    '''
+    directorio = obtener_directorio_exportaciones().name
+    limite = time.time() - ANTIGUEDAD_MAXIMA_EXPORTACION
+    for ruta in glob.glob(os.path.join(directorio, 'ods7_*')):
+        try:
+            if os.path.getmtime(ruta) < limite:
+                os.remove(ruta)
+        except OSError:
+            pass
+
+
+def iniciar_exportacion(indicadores, codigos_paises, rango_anios, formato):
+    '''
+    Lanza exportar_panel en un hilo de fondo y guarda la tarea en
+    session_state['exportacion'], reemplazando (y borrando) la anterior.
+    '''
+    tarea_anterior = st.session_state.get('exportacion')
+    if tarea_anterior is not None and tarea_anterior['estado'] != 'en curso':
+        if os.path.exists(tarea_anterior['ruta']):
+            os.remove(tarea_anterior['ruta'])
+    limpiar_exportaciones_antiguas()
+
+    extension = 'csv' if formato == 'CSV' else 'parquet'
+    descriptor, ruta = tempfile.mkstemp(
+        prefix='ods7_', suffix=f'.{extension}', dir=obtener_directorio_exportaciones().name
+    )
+    os.close(descriptor)
+
+    tarea = {
+        'estado': 'en curso',
+        'progreso': 0.0,
+        'filas': 0,
+        'error': None,
+        'ruta': ruta,
+        'nombre_archivo': f'ods7_panel_{rango_anios[0]}_{rango_anios[1]}.{extension}',
+        'mime': 'text/csv' if formato == 'CSV' else 'application/vnd.apache.parquet'
+    }
+    st.session_state['exportacion'] = tarea
+    threading.Thread(
+        target=exportar_panel,
+        args=(tarea, list(indicadores), list(codigos_paises), rango_anios, formato, ruta),
+        daemon=True
+    ).start()
+
+
+###############################################################################
+#                  PLANOS "DELTA A 2030" (CUBO DE INDICADORES)                #
+###############################################################################
+
+ANIO_OBJETIVO = 2030
+ANIO_INICIO_AJUSTE_PLANOS = 2005
+REINTENTOS_PLANOS = 2
+
+
+def calcular_planos_delta(trabajo):
+    '''
+    Precalcula, para todos los países e indicadores, el valor actual (último
+    año con dato), el valor proyectado a ANIO_OBJETIVO (tendencia lineal
+    desde ANIO_INICIO_AJUSTE_PLANOS, al menos 3 años, acotada por 'limites')
+    y el delta entre ambos.
+
+    Las regresiones se resuelven a la vez para todos los países con sumas
+    por fila. El resultado se guarda en trabajo['resultado']:
+    - 'codigos', 'nombres': países (eje 'país' de los arreglos)
+    - 'cubo': float32 (indicadores × países × 3) con actual, proyección y delta
+    - 'planos': float32 (indicador x × indicador y × países × 2) con el valor
+      actual del indicador x y el delta a 2030 del indicador y
+
+    Pensada para correr en un hilo aparte: no usa la API de Streamlit.
+    '''
+    try:
+        nombres_indicadores = list(INDICADORES)
+        tablas = []
+        nombres = {}
+        for posicion, nombre_indicador in enumerate(nombres_indicadores):
+            nombre_valor = obtener_nombre_columna_valor(nombre_indicador)
+            df_indicador = leer_panel_almacenado(nombre_valor)
+            nombres.update(zip(df_indicador['country_code'], df_indicador['country_name']))
+            tablas.append(df_indicador.pivot_table(index='country_code', columns='year', values=nombre_valor))
+            trabajo['progreso'] = 0.5 * (posicion + 1) / len(nombres_indicadores)
+
+        codigos = np.array(sorted(nombres))
+        cubo = np.full((len(nombres_indicadores), len(codigos), 3), np.nan, dtype=np.float32)
+
+        for posicion, (nombre_indicador, tabla) in enumerate(zip(nombres_indicadores, tablas)):
+            tabla = tabla.reindex(index=codigos)
+            anios = tabla.columns.to_numpy().astype(float)
+            valores = tabla.to_numpy().astype(float)
+            observado = ~np.isnan(valores)
+
+            # Valor actual: último año con dato de cada país
+            ultimo = observado.shape[1] - 1 - np.argmax(observado[:, ::-1], axis=1)
+            actual = np.where(observado.any(axis=1), valores[np.arange(len(codigos)), ultimo], np.nan)
+
+            # Tendencia lineal y ~ año, resuelta para todas las filas a la vez
+            en_ventana = observado & (anios >= ANIO_INICIO_AJUSTE_PLANOS)
+            t = np.where(en_ventana, anios - ANIO_INICIO_AJUSTE_PLANOS, 0.0)
+            y = np.where(en_ventana, valores, 0.0)
+            n = en_ventana.sum(axis=1)
+            suma_t, suma_y = t.sum(axis=1), y.sum(axis=1)
+            suma_tt, suma_ty = (t * t).sum(axis=1), (t * y).sum(axis=1)
+            with np.errstate(invalid='ignore', divide='ignore'):
+                pendiente = (n * suma_ty - suma_t * suma_y) / (n * suma_tt - suma_t ** 2)
+                intercepto = (suma_y - pendiente * suma_t) / n
+            proyeccion = intercepto + pendiente * (ANIO_OBJETIVO - ANIO_INICIO_AJUSTE_PLANOS)
+            proyeccion[n < 3] = np.nan
+
+            minimo, maximo = INDICADORES[nombre_indicador].get('limites', (None, None))
+            if minimo is not None or maximo is not None:
+                proyeccion = np.clip(proyeccion, minimo, maximo)
+
+            cubo[posicion, :, 0] = actual
+            cubo[posicion, :, 1] = proyeccion
+            cubo[posicion, :, 2] = proyeccion - actual
+            trabajo['progreso'] = 0.5 + 0.5 * (posicion + 1) / len(nombres_indicadores)
+
+        planos = np.empty((len(nombres_indicadores), len(nombres_indicadores), len(codigos), 2), dtype=np.float32)
+        planos[..., 0] = cubo[:, None, :, 0]
+        planos[..., 1] = cubo[None, :, :, 2]
+
+        trabajo['resultado'] = {
+            'codigos': codigos,
+            'nombres': np.array([nombres[codigo] for codigo in codigos]),
+            'cubo': cubo,
+            'planos': planos
+        }
+        trabajo['estado'] = 'terminado'
+    except Exception as error:
+        trabajo['error'] = str(error)
+        trabajo['estado'] = 'error'
+
+
+def lanzar_trabajo_planos(trabajo):
+    trabajo.update({'estado': 'en curso', 'progreso': 0.0, 'resultado': None, 'error': None})
+    trabajo['intentos'] += 1
+    threading.Thread(target=calcular_planos_delta, args=(trabajo,), daemon=True).start()
+
+
+@st.cache_resource(max_entries=2, show_spinner=False)
+def obtener_trabajo_planos(versiones):
+    '''
+    Lanza (una sola vez por versión del panel, compartido entre sesiones) el
+    cálculo de los planos en un hilo de fondo y devuelve su estado.
+    '''
+    trabajo = {'intentos': 0, 'candado': threading.Lock()}
+    lanzar_trabajo_planos(trabajo)
+    return trabajo
+
+
+def reintentar_trabajo_planos(trabajo):
+    '''
+    Relanza un cálculo de planos que terminó en error, como mucho
+    REINTENTOS_PLANOS veces. Agotados los reintentos, el error se mantiene
+    hasta que cambie alguna versión del panel (nueva clave de caché), para
+    que un fallo persistente no relance el cálculo en cada rerun.
+    '''
+    with trabajo['candado']:
+        if trabajo['estado'] == 'error' and trabajo['intentos'] <= REINTENTOS_PLANOS:
+            lanzar_trabajo_planos(trabajo)
+
+
+def rerun_al_terminar(tarea, clave_en_pantalla):
+    '''
+    Para fragmentos que sondean una tarea de fondo con run_every: si la tarea
+    terminó (bien o con error) durante un refresco parcial, lanza un rerun
+    completo para que el fragmento deje de sondear. El último estado mostrado
+    se guarda en session_state[clave_en_pantalla].
+    '''
+    estado_mostrado = st.session_state.get(clave_en_pantalla)
+    st.session_state[clave_en_pantalla] = tarea['estado']
+    if estado_mostrado == 'en curso' and tarea['estado'] != 'en curso':
+        st.rerun()
+
+
 ###############################################################################
 #                          ENCABEZADO / PORTADA                               #
 ###############################################################################
@@ -252,7 +1263,14 @@ with st.container(border=True):
                 '- Un archivo .xlsx por indicador.\n'
                 '- Cobertura temporal aproximada: 2000–2023.\n'
                 '- La unidad y la definición dependen del indicador WDI original.\n'
-                '- Se excluyen agregados regionales (solo países con código de 3 letras).\n'
+                '- Se conservan las filas de los archivos WDI con código de 3 letras, lo que '
+                'incluye el agregado "North America" (NAC).\n'
+                '- Los agregados por región y grupo de ingreso (prefijo "AGR:") los calcula la app '
+                'a partir de data/WDICountry.xlsx, hoja "Country", columnas "Country Code", '
+                '"Region" e "Income Group"; sin ese archivo no se muestran.\n'
+                '- En esos agregados, los porcentajes y tasas son medias simples (sin ponderar '
+                'por población) de los países con dato, y las emisiones de CO₂ son sumas '
+                'escaladas por la cobertura (los países sin dato cuentan con la media del grupo).\n'
                 '- Se utiliza formato largo: país–año–valor.\n'
             )
         with col_der:
@@ -301,19 +1319,13 @@ with st.container(border=True):
         key='paleta_mapa'
     )
 
-    serie = df_anio_mapa[nombre_columna_valor_mapa].astype(float)
-
     if paleta == 'Desviaciones estándar (0.5σ)':
-        mu = float(serie.mean()) if len(serie) else 0.0
-        sd = float(serie.std(ddof=1)) if len(serie) > 1 else 0.0
-        if sd > 0:
-            z = (serie - mu) / sd
-            bins = [-999, -2.0, -1.5, -1.0, -0.5, 0.0, 0.5, 1.0, 1.5, 2.0, 999]
-            labels_bins = [
-                '< -2σ', '-2σ a -1.5σ', '-1.5σ a -1σ', '-1σ a -0.5σ', '-0.5σ a 0σ',
-                '0σ a 0.5σ', '0.5σ a 1σ', '1σ a 1.5σ', '1.5σ a 2σ', '> 2σ'
-            ]
-            df_anio_mapa['color_bin'] = pd.cut(z, bins=bins, labels=labels_bins)
+        df_anio_mapa, hay_variacion = calcular_bins_sigma(
+            indicador_mapa,
+            anio_seleccionado,
+            version_anio(indicador_mapa, anio_seleccionado)
+        )
+        if hay_variacion:
             palette = {
                 '< -2σ': '#313695',
                 '-2σ a -1.5σ': '#4575b4',
@@ -329,26 +1341,28 @@ with st.container(border=True):
             titulo = f'{indicador_mapa} - {anio_seleccionado} (bins 0.5σ)'
             etiqueta = 'Desviación estándar (bins 0.5σ)'
         else:
-            df_anio_mapa['color_bin'] = 'sin variación'
             palette = {'sin variación': '#cccccc'}
             titulo = f'{indicador_mapa} - {anio_seleccionado} (sin variación)'
             etiqueta = 'Variación'
     else:
         # Semáforo por terciles (qcut): Bajo (verde), Medio (amarillo), Alto (rojo)
-        try:
-            df_anio_mapa['color_bin'] = pd.qcut(serie, q=3, labels=['Bajo', 'Medio', 'Alto'])
+        indice_mapa, hay_terciles = calcular_indice_rangos(
+            indicador_mapa,
+            anio_seleccionado,
+            version_anio(indicador_mapa, anio_seleccionado)
+        )
+        df_anio_mapa['color_bin'] = df_anio_mapa['country_code'].map(indice_mapa['tercil'])
+        titulo = f'{indicador_mapa} - {anio_seleccionado} (Semáforo)'
+        if hay_terciles:
             palette = {
                 'Bajo': '#1a9850',   # verde
                 'Medio': '#fee08b',  # amarillo
                 'Alto': '#d73027'    # rojo
             }
-            titulo = f'{indicador_mapa} - {anio_seleccionado} (Semáforo)'
             etiqueta = 'Nivel (terciles)'
-        except Exception:
+        else:
             # Fallback si no se puede qcut (pocos valores únicos)
-            df_anio_mapa['color_bin'] = 'sin variación'
             palette = {'sin variación': '#cccccc'}
-            titulo = f'{indicador_mapa} - {anio_seleccionado} (Semáforo)'
             etiqueta = 'Nivel'
 
     figura_mapa = px.choropleth(
@@ -365,6 +1379,57 @@ with st.container(border=True):
 
     st.plotly_chart(figura_mapa, use_container_width=True)
 
+    with st.expander('Ver posiciones de los países'):
+        indice_anio, _ = calcular_indice_rangos(
+            indicador_mapa,
+            anio_seleccionado,
+            version_anio(indicador_mapa, anio_seleccionado)
+        )
+        columnas_tabla = ['country_name', 'valor', 'rango', 'percentil']
+
+        col_top, col_bottom = st.columns(2)
+        with col_top:
+            st.write(f'Valores más altos en {anio_seleccionado}:')
+            st.dataframe(indice_anio[columnas_tabla].head(5))
+        with col_bottom:
+            st.write(f'Valores más bajos en {anio_seleccionado}:')
+            st.dataframe(indice_anio[columnas_tabla].tail(5))
+
+        nombres_mapa = dict(zip(df_indicador_mapa['country_name'], df_indicador_mapa['country_code']))
+        pais_rango = st.selectbox(
+            'País para ver su posición en el tiempo:',
+            options=sorted(nombres_mapa),
+            key='pais_rango_mapa'
+        )
+        codigo_rango = nombres_mapa[pais_rango]
+
+        filas_rango = []
+        for anio in anios_disponibles:
+            indice_rango, _ = calcular_indice_rangos(indicador_mapa, anio, version_anio(indicador_mapa, anio))
+            if codigo_rango in indice_rango.index:
+                fila = indice_rango.loc[codigo_rango]
+                filas_rango.append({
+                    'year': int(anio),
+                    'rango': int(fila['rango']),
+                    'percentil': float(fila['percentil']),
+                    'paises': len(indice_rango)
+                })
+        df_rango = pd.DataFrame(filas_rango)
+
+        figura_rango = px.line(
+            df_rango,
+            x='year',
+            y='rango',
+            markers=True,
+            hover_data=['percentil', 'paises'],
+            labels={'year': 'Año', 'rango': 'Posición (1 = valor más alto)',
+                    'percentil': 'Percentil', 'paises': 'Países con dato'},
+            title=f'Posición de {pais_rango} en {indicador_mapa}'
+        )
+        figura_rango.update_yaxes(autorange='reversed')
+        figura_rango.update_layout(height=380)
+        st.plotly_chart(figura_rango, use_container_width=True)
+
 ###############################################################################
 #   SECCIÓN 3: SERIES TEMPORALES POR PAÍS PARA UN INDICADOR                  #
 ###############################################################################
@@ -379,15 +1444,16 @@ with st.container(border=True):
         key='indicador_series'
     )
 
-    df_indicador_series = obtener_df_indicador(indicador_series)
+    df_indicador_series = obtener_df_con_agregados(indicador_series)
     nombre_columna_valor_series = obtener_nombre_columna_valor(indicador_series)
 
-    paises_disponibles = sorted(df_indicador_series['country_name'].unique())
+    paises_disponibles = ordenar_entidades(df_indicador_series)
+    preparar_seleccion_paises('paises_series', paises_disponibles, 5)
     paises_seleccionados = st.multiselect(
         'Selecciona hasta 5 países para comparar:',
         options=paises_disponibles,
-        default=paises_disponibles[:5],
-        max_selections=5
+        max_selections=5,
+        key='paises_series'
     )
 
     if paises_seleccionados:
@@ -421,6 +1487,18 @@ with st.container(border=True):
                 label=fila['country_name'],
                 value=f'{fila[nombre_columna_valor_series]:,.2f}'
             )
+
+        if 'cobertura' in df_ultimo_anio.columns:
+            df_cobertura = df_ultimo_anio.dropna(subset=['cobertura'])
+            if not df_cobertura.empty:
+                st.caption(
+                    'Agregados: media simple (sin ponderar) de los países con dato, o suma '
+                    'escalada por la cobertura. Cobertura (países con dato / países del grupo): '
+                    + ', '.join(
+                        f'{fila["country_name"]} {fila["cobertura"]:.0%}'
+                        for _, fila in df_cobertura.iterrows()
+                    )
+                )
     else:
         st.info('Selecciona al menos un país para visualizar las series.')
 
@@ -494,9 +1572,14 @@ with st.container(border=True):
     st.plotly_chart(figura_dispersion, use_container_width=True)
 
     with st.expander('Ver tabla de datos para este año'):
+        indice_y, _ = calcular_indice_rangos(
+            indicador_eje_y, anio_relacion, version_anio(indicador_eje_y, anio_relacion)
+        )
         st.dataframe(
-            df_relacion[['country_name', 'country_code', nombre_columna_x, nombre_columna_y]]
-            .sort_values(by=nombre_columna_y, ascending=False)
+            ordenar_segun_indice(
+                df_relacion[['country_name', 'country_code', nombre_columna_x, nombre_columna_y]],
+                indice_y
+            )
         )
 
 
@@ -569,15 +1652,21 @@ with st.container(border=True):
     # Métricas y tabla
     with st.expander('Ver métricas y tabla'):
         # Correlación de Pearson simple
-        try:
-            corr = df_cmp_y[[col_co2, col_ren]].corr().iloc[0, 1]
-            st.metric('Correlación (Pearson)', f'{corr:0.3f}')
-        except Exception:
+        corr = calcular_correlacion_anio(
+            indicador_co2, indicador_ren, anio_cmp,
+            version_anio(indicador_co2, anio_cmp),
+            version_anio(indicador_ren, anio_cmp)
+        )
+        if np.isnan(corr):
             st.info('No se pudo calcular la correlación para este año.')
+        else:
+            st.metric('Correlación (Pearson)', f'{corr:0.3f}')
 
+        indice_ren, _ = calcular_indice_rangos(
+            indicador_ren, anio_cmp, version_anio(indicador_ren, anio_cmp)
+        )
         st.dataframe(
-            df_cmp_y[['country_name', 'country_code', col_co2, col_ren]]
-            .sort_values(by=col_ren, ascending=False)
+            ordenar_segun_indice(df_cmp_y[['country_name', 'country_code', col_co2, col_ren]], indice_ren)
         )
 
     # Series temporales paralelas (opcional): seleccionar países
@@ -585,10 +1674,10 @@ with st.container(border=True):
         st.html('<h3 style="color:#3D6E85;">Comparar emisiones de CO₂ con participación de energías renovables por País</h3>')
         
         paises_cmp = sorted(df_cmp['country_name'].unique())
+        preparar_seleccion_paises('paises_cmp_co2_ren', paises_cmp, 4)
         seleccion_paises = st.multiselect(
             'Países (máx. 4):',
             options=paises_cmp,
-            default=paises_cmp[:4],
             max_selections=4,
             key='paises_cmp_co2_ren'
         )
@@ -635,8 +1724,8 @@ with st.container(border=True):
     indicador_co2 = 'Emisiones de CO₂ totales (kt)'
     indicador_ren = 'Participación de energías renovables (% consumo final)'
 
-    df_co2 = obtener_df_indicador(indicador_co2)
-    df_ren = obtener_df_indicador(indicador_ren)
+    df_co2 = obtener_df_con_agregados(indicador_co2)
+    df_ren = obtener_df_con_agregados(indicador_ren)
 
     col_co2 = obtener_nombre_columna_valor(indicador_co2)
     col_ren = obtener_nombre_columna_valor(indicador_ren)
@@ -648,11 +1737,11 @@ with st.container(border=True):
     ).dropna(subset=[col_co2, col_ren])
 
     # Controles
-    paises_all = sorted(df_all['country_name'].unique())
+    paises_all = ordenar_entidades(df_all)
+    preparar_seleccion_paises('proj_paises', paises_all, 4)
     sel_paises = st.multiselect(
         'Países para proyectar (máx. 4):',
         options=paises_all,
-        default=paises_all[:4],
         max_selections=4,
         key='proj_paises'
     )
@@ -666,55 +1755,36 @@ with st.container(border=True):
         step=1
     )
 
-    def ajustar_lineal(x, y):
-        x = x.astype(float)
-        y = y.astype(float)
-        A = np.vstack([x, np.ones_like(x)]).T
-        coef, _, _, _ = np.linalg.lstsq(A, y, rcond=None)
-        m, b = coef[0], coef[1]
-        y_pred = m * x + b
-        ss_res = float(np.sum((y - y_pred) ** 2))
-        ss_tot = float(np.sum((y - np.mean(y)) ** 2)) if len(y) > 1 else 0.0
-        r2 = 1 - ss_res / ss_tot if ss_tot > 0 else float('nan')
-        return m, b, y_pred, r2
-
     resultados = []
     puntos_pred_ren = []
     puntos_pred_co2 = []
 
     if sel_paises:
         df_fit = df_all[(df_all['year'] >= rango[0]) & (df_all['year'] <= rango[1])]
+        minimo_ren, maximo_ren = INDICADORES[indicador_ren].get('limites', (None, None))
 
         for pais in sel_paises:
-            df_p = df_fit[df_fit['country_name'] == pais].sort_values('year')
+            df_p = df_fit[df_fit['country_name'] == pais]
             if len(df_p) < 3:
                 continue
 
+            codigo_pais = df_p['country_code'].iloc[0]
+            sumas = calcular_sumas_prefijo(
+                indicador_co2, indicador_ren, codigo_pais, usar_log_co2,
+                version_pais(indicador_co2, codigo_pais),
+                version_pais(indicador_ren, codigo_pais)
+            )
+
             # Ajuste renovables ~ año
-            m_r, b_r, yhat_r, r2_r = ajustar_lineal(df_p['year'].to_numpy(), df_p[col_ren].to_numpy())
-            ren_2030 = m_r * 2030 + b_r
-            ren_2030 = float(np.clip(ren_2030, 0, 100))
+            (m_r, b_r), r2_r, _ = ajustar_rango(sumas, 'ren', rango[0], rango[1])
+            ren_2030 = m_r * (2030 - ANIO_REFERENCIA_AJUSTE) + b_r
+            if minimo_ren is not None or maximo_ren is not None:
+                ren_2030 = float(np.clip(ren_2030, minimo_ren, maximo_ren))
 
             # Ajuste CO2 ~ año + renovables (opcional log)
-            y_co2 = df_p[col_co2].astype(float)
-            if usar_log_co2:
-                y_co2 = np.log(y_co2.replace({0: np.nan})).dropna()
-                df_p = df_p.loc[y_co2.index]
-
-            X = np.column_stack([
-                np.ones(len(df_p)),
-                df_p['year'].to_numpy().astype(float),
-                df_p[col_ren].to_numpy().astype(float)
-            ])
-            y = y_co2.to_numpy().astype(float)
             try:
-                beta, _, _, _ = np.linalg.lstsq(X, y, rcond=None)
-                y_pred = X @ beta
-                ss_res = float(np.sum((y - y_pred) ** 2))
-                ss_tot = float(np.sum((y - np.mean(y)) ** 2)) if len(y) > 1 else 0.0
-                r2_c = 1 - ss_res / ss_tot if ss_tot > 0 else float('nan')
-
-                x2030 = np.array([1.0, 2030.0, ren_2030])
+                beta, r2_c, _ = ajustar_rango(sumas, 'co2', rango[0], rango[1])
+                x2030 = np.array([1.0, 2030.0 - ANIO_REFERENCIA_AJUSTE, ren_2030])
                 y2030 = float(x2030 @ beta)
                 co2_2030 = float(np.exp(y2030)) if usar_log_co2 else float(y2030)
             except Exception:
@@ -780,6 +1850,244 @@ with st.container(border=True):
     else:
         st.info('Selecciona al menos un país para proyectar.')
 
+###############################################################################
+#   SECCIÓN 7: PAÍSES CON TRAYECTORIAS SIMILARES                              #
+###############################################################################
+
+SELECTORES_PAISES = {
+    'paises_series': 5,
+    'paises_cmp_co2_ren': 4,
+    'proj_paises': 4
+}
+
+
+def prellenar_selectores(paises):
+    for clave, maximo in SELECTORES_PAISES.items():
+        st.session_state[clave] = paises[:maximo]
+
+
+st.markdown('<a id="paises-similares"></a><br><br>', unsafe_allow_html=True)
+with st.container(border=True):
+    st.html('<h3 style="color:#3D6E85;">Países con trayectorias similares</h3>')
+    st.caption(
+        f'Cada país se describe por la trayectoria normalizada de todos los '
+        f'indicadores desde {ANIO_INICIO_TRAYECTORIA}. La distancia es euclidiana '
+        f'sobre ese vector (menor distancia = trayectoria más parecida).'
+    )
+
+    indice_similitud = construir_indice_similitud(versiones_indicadores())
+    nombres_indice = list(indice_similitud['nombres'])
+
+    col_pais, col_k = st.columns([3, 1])
+    with col_pais:
+        pais_referencia = st.selectbox(
+            'País de referencia:',
+            options=sorted(nombres_indice),
+            key='pais_similitud'
+        )
+    with col_k:
+        k_vecinos = st.number_input('Número de pares', min_value=1, max_value=10, value=5, step=1)
+
+    fila_referencia = nombres_indice.index(pais_referencia)
+    vecinos, distancias = vecinos_mas_cercanos(indice_similitud, [fila_referencia], k=int(k_vecinos))
+
+    df_vecinos = pd.DataFrame({
+        'País': indice_similitud['nombres'][vecinos[0]],
+        'Código': indice_similitud['codigos'][vecinos[0]],
+        'Distancia': distancias[0],
+        'Cobertura de datos (%)': 100 * indice_similitud['cobertura'][vecinos[0]]
+    })
+    st.dataframe(df_vecinos, hide_index=True)
+
+    st.button(
+        'Usar estos países en las secciones de series, CO₂ vs renovables y proyección',
+        on_click=prellenar_selectores,
+        args=([pais_referencia] + list(df_vecinos['País']),)
+    )
+
+###############################################################################
+#   SECCIÓN 8: PLANOS DELTA A 2030                                            #
+###############################################################################
+
+def mostrar_plano_delta(trabajo, indice_x, indice_y, log_x):
+    rerun_al_terminar(trabajo, 'planos_en_pantalla')
+    if trabajo['estado'] == 'en curso':
+        st.progress(trabajo['progreso'], text='Calculando planos para todos los países...')
+        return
+    if trabajo['estado'] == 'error':
+        st.error(f'No se pudieron calcular los planos: {trabajo["error"]}')
+        return
+
+    resultado = trabajo['resultado']
+    plano = resultado['planos'][indice_x, indice_y]
+    df_plano = pd.DataFrame({
+        'country_name': resultado['nombres'],
+        'x': plano[:, 0],
+        'delta': plano[:, 1]
+    }).dropna()
+    if log_x:
+        # La escala logarítmica no puede mostrar valores <= 0
+        df_plano = df_plano[df_plano['x'] > 0]
+
+    nombre_x = list(INDICADORES)[indice_x]
+    nombre_y = list(INDICADORES)[indice_y]
+    st.write(f'Países con datos para este plano: {len(df_plano)}.')
+
+    figura_plano = px.scatter(
+        df_plano,
+        x='x',
+        y='delta',
+        hover_name='country_name',
+        labels={'x': f'{nombre_x} (último dato)', 'delta': f'Δ {nombre_y} a {ANIO_OBJETIVO}'},
+        title=f'Δ {nombre_y} a {ANIO_OBJETIVO} vs {nombre_x}'
+    )
+    figura_plano.add_hline(y=0, line_dash='dash', line_color='gray')
+    figura_plano.update_traces(marker=dict(size=8, opacity=0.8))
+    if log_x:
+        figura_plano.update_xaxes(type='log')
+    figura_plano.update_layout(height=500)
+    st.plotly_chart(figura_plano, use_container_width=True)
+
+
+st.markdown('<a id="planos-delta"></a><br><br>', unsafe_allow_html=True)
+with st.container(border=True):
+    st.html(f'<h3 style="color:#3D6E85;">Planos: delta a {ANIO_OBJETIVO} por indicador</h3>')
+    st.caption(
+        f'Cada punto es un país. Abscisa: último valor disponible del indicador X. '
+        f'Ordenada: diferencia entre la proyección lineal a {ANIO_OBJETIVO} (ajustada '
+        f'desde {ANIO_INICIO_AJUSTE_PLANOS}) y el último valor del indicador Y.'
+    )
+
+    col_x, col_y = st.columns(2)
+    with col_x:
+        indicador_plano_x = st.selectbox(
+            'Indicador en abscisa:',
+            options=list(INDICADORES.keys()),
+            index=1,
+            key='indicador_plano_x'
+        )
+    with col_y:
+        indicador_plano_y = st.selectbox(
+            f'Indicador con delta a {ANIO_OBJETIVO}:',
+            options=list(INDICADORES.keys()),
+            index=2,
+            key='indicador_plano_y'
+        )
+    log_x_plano = st.checkbox('Escala logarítmica en abscisa', value=False, key='log_x_plano')
+
+    trabajo_planos = obtener_trabajo_planos(versiones_indicadores())
+    reintentar_trabajo_planos(trabajo_planos)
+    st.fragment(
+        mostrar_plano_delta,
+        run_every=1.0 if trabajo_planos['estado'] == 'en curso' else None
+    )(
+        trabajo_planos,
+        list(INDICADORES).index(indicador_plano_x),
+        list(INDICADORES).index(indicador_plano_y),
+        log_x_plano
+    )
+
+###############################################################################
+#   SECCIÓN 9: DESCARGA DE DATOS                                              #
+###############################################################################
+
+def mostrar_exportacion():
+    '''
+    Muestra el avance de la exportación de la sesión y, al terminar, el botón
+    de descarga.
+
+    La entrega no es en streaming: st.download_button necesita el archivo
+    entero en memoria. Se lee una sola vez por tarea y se guarda en
+    tarea['contenido'], así los reruns posteriores reutilizan los mismos bytes
+    en lugar de volver a leerlos. Si limpiar_exportaciones_antiguas ya borró
+    el archivo, la tarea pasa a 'expirado' y libera esos bytes.
+    '''
+    tarea = st.session_state.get('exportacion')
+    if tarea is None:
+        return
+
+    rerun_al_terminar(tarea, 'exportacion_en_pantalla')
+
+    if tarea['estado'] == 'terminado' and not os.path.exists(tarea['ruta']):
+        # Lo borró la limpieza de exportaciones antiguas (la de cualquier sesión)
+        tarea['estado'] = 'expirado'
+        tarea.pop('contenido', None)
+
+    if tarea['estado'] == 'en curso':
+        st.progress(tarea['progreso'], text=f'Generando archivo... {tarea["filas"]:,} filas')
+    elif tarea['estado'] == 'error':
+        st.error(f'No se pudo generar el archivo: {tarea["error"]}')
+    elif tarea['estado'] == 'expirado':
+        st.warning('El archivo expiró; vuelve a generarlo.')
+    else:
+        if 'contenido' not in tarea:
+            with open(tarea['ruta'], 'rb') as archivo:
+                tarea['contenido'] = archivo.read()
+        st.success(f'Archivo listo: {tarea["filas"]:,} filas.')
+        st.download_button(
+            'Descargar',
+            data=tarea['contenido'],
+            file_name=tarea['nombre_archivo'],
+            mime=tarea['mime'],
+            on_click='ignore'
+        )
+
+
+st.markdown('<a id="descarga"></a><br><br>', unsafe_allow_html=True)
+with st.container(border=True):
+    st.html('<h3 style="color:#3D6E85;">Descarga de datos</h3>')
+    st.caption(
+        'Genera un archivo en formato largo (país, año, indicador, valor) con la '
+        'selección indicada. El archivo se arma en segundo plano; puedes seguir '
+        'usando el resto del tablero mientras tanto.'
+    )
+
+    indicadores_descarga = st.multiselect(
+        'Indicadores:',
+        options=list(INDICADORES.keys()),
+        default=list(INDICADORES.keys()),
+        key='indicadores_descarga'
+    )
+
+    if indicadores_descarga:
+        paises_descarga, (anio_min_descarga, anio_max_descarga) = resumir_indicadores(
+            tuple(indicadores_descarga),
+            tuple(obtener_manifiesto(nombre)['version'] for nombre in indicadores_descarga)
+        )
+
+        seleccion_descarga = st.multiselect(
+            'Países (vacío = todos):',
+            options=sorted(paises_descarga),
+            key='paises_descarga'
+        )
+        rango_descarga = st.slider(
+            'Rango de años:',
+            min_value=anio_min_descarga,
+            max_value=anio_max_descarga,
+            value=(anio_min_descarga, anio_max_descarga),
+            step=1,
+            key='rango_descarga'
+        )
+        formato_descarga = st.radio('Formato', options=['CSV', 'Parquet'], horizontal=True, key='formato_descarga')
+
+        tarea_actual = st.session_state.get('exportacion')
+        st.button(
+            'Generar archivo',
+            on_click=iniciar_exportacion,
+            args=(
+                indicadores_descarga,
+                [paises_descarga[pais] for pais in seleccion_descarga],
+                rango_descarga,
+                formato_descarga
+            ),
+            disabled=tarea_actual is not None and tarea_actual['estado'] == 'en curso'
+        )
+
+        en_curso = st.session_state.get('exportacion', {}).get('estado') == 'en curso'
+        st.fragment(mostrar_exportacion, run_every=1.0 if en_curso else None)()
+    else:
+        st.info('Selecciona al menos un indicador para descargar.')
+
 ###############################################################################
 #                       MENÚ DE NAVEGACIÓN LATERAL                            #
 ###############################################################################
@@ -811,5 +2119,8 @@ with st.sidebar.container():
     st.markdown('[Relaciones entre indicadores](#relaciones)')
     st.markdown('[CO₂ vs Renovables](#co2-vs-renovables)')
     st.markdown('[Proyección a 2030](#proyeccion-2030)')
+    st.markdown('[Países similares](#paises-similares)')
+    st.markdown('[Planos delta a 2030](#planos-delta)')
+    st.markdown('[Descarga de datos](#descarga)')
     st.markdown('---')
     st.caption('Contacto: jfescob@udea.edu.co')
@@ -0,0 +1,344 @@
+'''
+Prueba de carga local del dashboard ODS 7 en Mapas.
+
+Levanta app.py con `streamlit run` en modo headless y lo recorre con muchas
+sesiones simuladas a la vez. Cada sesión es un cliente websocket que habla el
+mismo protocolo que el navegador (BackMsg / ForwardMsg) y sigue un guion de
+interacciones realistas: mover el año del mapa, cambiar indicadores, elegir
+países y cambiar el rango de la proyección. La latencia de cada rerun se mide
+desde el envío del cambio hasta el mensaje 'script_finished'.
+
+Para cada nivel de concurrencia se reportan percentiles de latencia,
+throughput (reruns por segundo) y memoria residente máxima del servidor.
+
+Uso:
+    python prueba_carga.py --concurrencias 1 2 4 8 --pasos 10
+    python prueba_carga.py --url ws://localhost:8501 --pid <pid del servidor>
+'''
+
+import argparse
+import asyncio
+import random
+import socket
+import subprocess
+import sys
+import time
+
+import numpy as np
+from streamlit.proto.BackMsg_pb2 import BackMsg
+from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+from tornado.httpclient import HTTPRequest
+from tornado.websocket import websocket_connect
+
+
+TIPOS_WIDGET = ('slider', 'selectbox', 'multiselect', 'radio', 'checkbox', 'number_input')
+
+
+###############################################################################
+#                        SERVIDOR Y MEMORIA                                   #
+###############################################################################
+
+def puerto_libre():
+    with socket.socket() as s:
+        s.bind(('localhost', 0))
+        return s.getsockname()[1]
+
+
+def iniciar_servidor(ruta_app, puerto):
+    '''Lanza `streamlit run` en segundo plano y espera a que acepte conexiones.'''
+    proceso = subprocess.Popen(
+        [
+            sys.executable, '-m', 'streamlit', 'run', ruta_app,
+            '--server.headless', 'true',
+            '--server.port', str(puerto),
+            '--server.fileWatcherType', 'none',
+            '--browser.gatherUsageStats', 'false'
+        ],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL
+    )
+    limite = time.monotonic() + 60
+    while time.monotonic() < limite:
+        if proceso.poll() is not None:
+            raise RuntimeError('El servidor de Streamlit terminó al arrancar.')
+        try:
+            with socket.create_connection(('localhost', puerto), timeout=1):
+                return proceso
+        except OSError:
+            time.sleep(0.2)
+    proceso.terminate()
+    raise TimeoutError('El servidor de Streamlit no respondió en 60 s.')
+
+
+def rss_mb(pid):
+    '''
+    Memoria residente actual del proceso en MB, leída de /proc (Linux).
+    Devuelve NaN si no está disponible.
+    '''
+    try:
+        with open(f'/proc/{pid}/status') as archivo:
+            for linea in archivo:
+                if linea.startswith('VmRSS:'):
+                    return int(linea.split()[1]) / 1024
+    except OSError:
+        pass
+    return float('nan')
+
+
+async def muestrear_memoria(pid, muestras, intervalo=0.05):
+    while True:
+        muestras.append(rss_mb(pid))
+        await asyncio.sleep(intervalo)
+
+
+###############################################################################
+#                         SESIÓN SIMULADA                                     #
+###############################################################################
+
+class Sesion:
+    '''
+    Cliente websocket de una sesión del dashboard.
+
+    Tras cada rerun guarda el catálogo de widgets renderizados (etiqueta →
+    proto del widget), que los guiones usan para elegir valores válidos.
+    '''
+
+    def __init__(self, url):
+        self.url = url
+        self.ws = None
+        self.widgets = {}
+        self.excepciones = []
+
+    async def conectar(self):
+        solicitud = HTTPRequest(
+            f'{self.url}/_stcore/stream',
+            headers={'Sec-WebSocket-Protocol': 'streamlit'}
+        )
+        self.ws = await websocket_connect(solicitud, max_message_size=1 << 30)
+
+    async def rerun(self, estado_widget=None):
+        '''Envía un rerun (opcionalmente con un widget cambiado) y devuelve su latencia.'''
+        mensaje = BackMsg()
+        mensaje.rerun_script.query_string = ''
+        if estado_widget is not None:
+            mensaje.rerun_script.widget_states.widgets.append(estado_widget)
+
+        widgets = {}
+        inicio = time.perf_counter()
+        await self.ws.write_message(mensaje.SerializeToString(), binary=True)
+        while True:
+            crudo = await self.ws.read_message()
+            if crudo is None:
+                raise ConnectionError('El servidor cerró la conexión.')
+            respuesta = ForwardMsg()
+            respuesta.ParseFromString(crudo)
+            tipo = respuesta.WhichOneof('type')
+
+            if tipo == 'delta' and respuesta.delta.WhichOneof('type') == 'new_element':
+                elemento = respuesta.delta.new_element
+                tipo_elemento = elemento.WhichOneof('type')
+                if tipo_elemento in TIPOS_WIDGET:
+                    widget = getattr(elemento, tipo_elemento)
+                    widgets[widget.label] = (tipo_elemento, widget)
+                elif tipo_elemento == 'exception':
+                    self.excepciones.append(f'{elemento.exception.type}: {elemento.exception.message}')
+
+            elif tipo == 'script_finished':
+                latencia = time.perf_counter() - inicio
+                self.widgets = widgets
+                return latencia
+
+    def buscar(self, etiqueta):
+        for etiqueta_widget, (tipo, widget) in self.widgets.items():
+            if etiqueta_widget.startswith(etiqueta):
+                return tipo, widget
+        return None, None
+
+    def cerrar(self):
+        if self.ws is not None:
+            self.ws.close()
+
+
+###############################################################################
+#                      GUIONES DE INTERACCIÓN                                 #
+###############################################################################
+
+def nuevo_estado(widget):
+    estado = BackMsg().rerun_script.widget_states.widgets.add()
+    estado.id = widget.id
+    return estado
+
+
+def mover_slider(etiqueta):
+    def interaccion(sesion, azar):
+        _, widget = sesion.buscar(etiqueta)
+        if widget is None:
+            return None
+        estado = nuevo_estado(widget)
+        minimo, maximo = int(widget.min), int(widget.max)
+        if len(widget.default) == 2:
+            inicio = azar.randint(minimo, max(minimo, maximo - 3))
+            estado.double_array_value.data.extend([inicio, azar.randint(min(inicio + 3, maximo), maximo)])
+        else:
+            estado.double_array_value.data.append(azar.randint(minimo, maximo))
+        return estado
+    return interaccion
+
+
+def cambiar_opcion(etiqueta):
+    def interaccion(sesion, azar):
+        tipo, widget = sesion.buscar(etiqueta)
+        if widget is None:
+            return None
+        estado = nuevo_estado(widget)
+        if tipo == 'radio':
+            estado.int_value = azar.randrange(len(widget.options))
+        else:
+            estado.string_value = azar.choice(list(widget.options))
+        return estado
+    return interaccion
+
+
+def elegir_paises(etiqueta):
+    def interaccion(sesion, azar):
+        _, widget = sesion.buscar(etiqueta)
+        if widget is None:
+            return None
+        estado = nuevo_estado(widget)
+        opciones = list(widget.options)
+        maximo = widget.max_selections or 5
+        estado.string_array_value.data.extend(azar.sample(opciones, k=min(maximo, len(opciones))))
+        return estado
+    return interaccion
+
+
+INTERACCIONES = [
+    mover_slider('Año'),
+    cambiar_opcion('Paleta de colores'),
+    cambiar_opcion('Selecciona el indicador para las series'),
+    cambiar_opcion('Indicador en eje X'),
+    cambiar_opcion('Indicador en eje Y'),
+    elegir_paises('Selecciona hasta 5 países'),
+    elegir_paises('Países para proyectar'),
+    mover_slider('Rango de años para ajustar')
+]
+
+
+async def ejecutar_sesion(url, pasos, semilla):
+    '''
+    Simula una sesión: carga inicial más 'pasos' interacciones al azar.
+
+    Devuelve la lista de latencias (segundos) de cada rerun y los mensajes
+    de las excepciones que mostró la app.
+    '''
+    azar = random.Random(semilla)
+    sesion = Sesion(url)
+    await sesion.conectar()
+    try:
+        latencias = [await sesion.rerun()]
+        for _ in range(pasos):
+            estado = azar.choice(INTERACCIONES)(sesion, azar)
+            latencias.append(await sesion.rerun(estado))
+    finally:
+        sesion.cerrar()
+    return latencias, sesion.excepciones
+
+
+###############################################################################
+#                          EJECUCIÓN Y REPORTE                                #
+###############################################################################
+
+async def medir_concurrencia(url, pid, concurrencia, pasos, semilla):
+    muestras = [rss_mb(pid)]
+    muestreo = asyncio.create_task(muestrear_memoria(pid, muestras))
+
+    inicio = time.perf_counter()
+    resultados = await asyncio.gather(*[
+        ejecutar_sesion(url, pasos, semilla + sesion)
+        for sesion in range(concurrencia)
+    ])
+    duracion = time.perf_counter() - inicio
+
+    muestreo.cancel()
+
+    latencias = np.concatenate([np.array(lat) for lat, _ in resultados])
+    p50, p90, p99 = np.percentile(latencias, [50, 90, 99]) * 1000
+    return {
+        'sesiones': concurrencia,
+        'reruns': len(latencias),
+        'excepciones': sum(len(exc) for _, exc in resultados),
+        'mensajes': sorted({mensaje for _, exc in resultados for mensaje in exc}),
+        'p50_ms': float(p50),
+        'p90_ms': float(p90),
+        'p99_ms': float(p99),
+        'max_ms': float(latencias.max() * 1000),
+        'reruns_por_s': len(latencias) / duracion,
+        'rss_pico_mb': float(np.nanmax(muestras)) if not np.all(np.isnan(muestras)) else float('nan')
+    }
+
+
+def imprimir_tabla(filas):
+    columnas = ['sesiones', 'reruns', 'excepciones', 'p50_ms', 'p90_ms', 'p99_ms',
+                'max_ms', 'reruns_por_s', 'rss_pico_mb']
+    print(' '.join(f'{columna:>12}' for columna in columnas))
+    for fila in filas:
+        print(' '.join(
+            f'{fila[columna]:>12.1f}' if isinstance(fila[columna], float) else f'{fila[columna]:>12}'
+            for columna in columnas
+        ))
+
+
+async def ejecutar(args, url, pid):
+    # Calentamiento: sincroniza el panel y llena las cachés compartidas
+    await ejecutar_sesion(url, 0, args.semilla)
+
+    filas = []
+    for concurrencia in args.concurrencias:
+        fila = await medir_concurrencia(url, pid, concurrencia, args.pasos, args.semilla)
+        print(f'{concurrencia} sesiones: p50 {fila["p50_ms"]:.0f} ms, {fila["reruns_por_s"]:.1f} reruns/s')
+        filas.append(fila)
+    return filas
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Prueba de carga local de app.py.')
+    parser.add_argument('--app', default='app.py', help='Ruta del script de Streamlit.')
+    parser.add_argument('--url', default=None,
+                        help='Servidor ya levantado (p. ej. ws://localhost:8501). '
+                             'Si se omite se lanza uno nuevo.')
+    parser.add_argument('--pid', type=int, default=None,
+                        help='PID del servidor indicado en --url, para medir su memoria.')
+    parser.add_argument('--concurrencias', type=int, nargs='+', default=[1, 2, 4, 8],
+                        help='Niveles de sesiones simultáneas a medir.')
+    parser.add_argument('--pasos', type=int, default=10,
+                        help='Interacciones por sesión (además de la carga inicial).')
+    parser.add_argument('--semilla', type=int, default=0)
+    args = parser.parse_args()
+
+    servidor = None
+    if args.url is None:
+        puerto = puerto_libre()
+        servidor = iniciar_servidor(args.app, puerto)
+        url, pid = f'ws://localhost:{puerto}', servidor.pid
+    else:
+        url, pid = args.url.rstrip('/'), args.pid
+
+    try:
+        filas = asyncio.run(ejecutar(args, url, pid))
+    finally:
+        if servidor is not None:
+            servidor.terminate()
+            servidor.wait()
+
+    print()
+    imprimir_tabla(filas)
+
+    mensajes = sorted({mensaje for fila in filas for mensaje in fila['mensajes']})
+    if mensajes:
+        print('\nExcepciones mostradas por la app:')
+        for mensaje in mensajes:
+            print(f'- {mensaje}')
+
+
+if __name__ == '__main__':
+    main()